@@ -0,0 +1,96 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import chain
+from typing import Dict, List, Sequence, Tuple
+
+from .utils import ScopeReturns
+
+NameToLines = Dict[str, List[int]]
+NameToSortedLines = Dict[str, Tuple[int, ...]]
+SortedLines = Tuple[int, ...]
+BlockPosition = Dict[int, int]
+
+
+class Frame:
+    __slots__ = (
+        'assigns',
+        'refs',
+        'refs_sorted',
+        'tries',
+        'loops',
+        'block_starts',
+        'block_ends',
+        'returns',
+    )
+
+    def __init__(self) -> None:
+        # Assigns are recorded as the body is walked in source order, so
+        # the lines of a name are already sorted. Nested functions get a
+        # frame of their own and do not break that order.
+        self.assigns: NameToLines = defaultdict(list)
+        self.refs: NameToLines = defaultdict(list)
+        self.refs_sorted: NameToSortedLines = {}
+        self.tries: BlockPosition = {}
+        self.loops: BlockPosition = {}
+        self.block_starts: SortedLines = ()
+        self.block_ends: SortedLines = ()
+        self.returns = ScopeReturns([], [], [])
+
+    def clear(self) -> None:
+        # makes the frame reusable for another function
+        self.assigns.clear()
+        self.refs.clear()
+        self.refs_sorted.clear()
+        self.tries.clear()
+        self.loops.clear()
+        self.block_starts = self.block_ends = ()
+        for returns in self.returns:
+            returns.clear()
+
+    def freeze(self) -> None:
+        # called once the function body is visited, before the R504 checks
+        self.block_starts, self.block_ends = _merged_blocks(
+            self.tries, self.loops
+        )
+
+    def sorted_refs(self, name: str) -> SortedLines:
+        # Sorted on first use and shared by all returns of the name. The
+        # refs are complete by then, this cache needs no invalidation.
+        lines = self.refs_sorted.get(name)
+        if lines is None:
+            lines = self.refs_sorted[name] = tuple(sorted(self.refs[name]))
+        return lines
+
+    def within_blocks(self, lines: Sequence[int]) -> bool:
+        # Check sorted lines against the (start, end] blocks, bisecting
+        # into the longer of the two once per item of the shorter one.
+        starts, ends = self.block_starts, self.block_ends
+        if len(starts) < len(lines):
+            for start, end in zip(starts, ends):
+                i = bisect_right(lines, start)
+                if i < len(lines) and lines[i] <= end:
+                    return True
+            return False
+
+        for line in lines:
+            i = bisect_left(starts, line) - 1
+            if i >= 0 and line <= ends[i]:
+                return True
+        return False
+
+
+def _merged_blocks(
+    *blocks: BlockPosition,
+) -> Tuple[SortedLines, SortedLines]:
+    # Union of the (start, end] line ranges as disjoint ranges sorted by
+    # start. Nested blocks collapse into the enclosing one, so a single
+    # bisect finds the only range that may contain a line.
+    starts: List[int] = []
+    ends: List[int] = []
+    for start, end in sorted(chain(*(b.items() for b in blocks))):
+        if ends and start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return tuple(starts), tuple(ends)
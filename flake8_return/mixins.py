@@ -0,0 +1,256 @@
+import ast
+import sys
+from bisect import bisect_left, bisect_right
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Type,
+    Union,
+)
+
+from flake8_plugin_utils import Visitor
+
+from .errors import (
+    ImplicitReturn,
+    ImplicitReturnValue,
+    UnnecessaryAssign,
+    UnnecessaryReturnNone,
+)
+from .frame import Frame
+from .utils import child_nodes, is_false
+
+Function = Union[ast.AsyncFunctionDef, ast.FunctionDef]
+Loop = Union[ast.For, ast.AsyncFor, ast.While]
+ForLoop = Union[ast.For, ast.AsyncFor]
+With = Union[ast.With, ast.AsyncWith]
+NodeHandler = Callable[[Any, Any], Iterable[ast.AST]]
+
+PY38 = sys.version_info >= (3, 8)
+
+# last statements that need no explicit return after them
+TERMINAL_TYPES = (ast.Return, ast.Raise, ast.While, ast.Try)
+
+
+class UnnecessaryAssignMixin(Visitor[None]):
+    # frame of the function being visited, set up by ReturnVisitor
+    _top: Optional[Frame]
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._loop_count: int = 0
+
+    def visit_For(self, node: ast.For) -> Iterable[ast.AST]:
+        return self._visit_loop(node)
+
+    def visit_AsyncFor(self, node: ast.AsyncFor) -> Iterable[ast.AST]:
+        return self._visit_loop(node)
+
+    def visit_While(self, node: ast.While) -> Iterable[ast.AST]:
+        return self._visit_loop(node)
+
+    def _visit_loop_py38(self, node: Loop) -> Iterable[ast.AST]:
+        top = self._top
+        if top is not None and node.end_lineno is not None:
+            top.loops[node.lineno] = node.end_lineno
+        return child_nodes(node)
+
+    def _visit_loop_py37(self, node: Loop) -> Iterable[ast.AST]:
+        # the loop body has to be walked here to keep count of nesting
+        self._loop_count += 1
+        self.generic_visit(node)
+        self._loop_count -= 1
+        return ()
+
+    _visit_loop = _visit_loop_py38 if PY38 else _visit_loop_py37
+
+    def visit_Assign(self, node: ast.Assign) -> Iterable[ast.AST]:
+        top = self._top
+        if top is None:
+            return ()
+
+        children: List[ast.AST] = []
+        if isinstance(node.value, ast.Name):
+            # a plain name has nothing else to visit
+            top.refs[node.value.id].append(node.value.lineno)
+        else:
+            children.append(node.value)
+
+        target = node.targets[0]
+        if isinstance(target, ast.Tuple) and not isinstance(
+            node.value, ast.Tuple
+        ):
+            # skip unpacking assign e.g: x, y = my_object
+            return children
+
+        children.extend(self._visit_assign_target(top, target))
+        return children
+
+    def visit_Name(self, node: ast.Name) -> Iterable[ast.AST]:
+        top = self._top
+        if top is not None:
+            top.refs[node.id].append(node.lineno)
+        return ()
+
+    def visit_Try(self, node: ast.Try) -> Iterable[ast.AST]:
+        top = self._top
+        # end_lineno is missing before Python 3.8
+        end_lineno = getattr(node, 'end_lineno', None)
+        if top is not None and end_lineno is not None:
+            top.tries[node.lineno] = end_lineno
+        return child_nodes(node)
+
+    def _visit_assign_target_py38(
+        self, top: Frame, node: ast.AST
+    ) -> List[ast.AST]:
+        if isinstance(node, ast.Tuple):
+            children: List[ast.AST] = []
+            for n in node.elts:
+                children.extend(self._visit_assign_target(top, n))
+            return children
+
+        if isinstance(node, ast.Name):
+            top.assigns[node.id].append(node.lineno)
+            return []
+
+        if isinstance(node, ast.Attribute):
+            return [node.value]
+
+        if isinstance(node, ast.Subscript):
+            # names in the index are real uses as well
+            return [node.value, node.slice]
+
+        # starred, etc.
+        return child_nodes(node)
+
+    def _visit_assign_target_py37(
+        self, top: Frame, node: ast.AST
+    ) -> List[ast.AST]:
+        if self._loop_count and isinstance(node, ast.Name):
+            # without loop positions, names assigned in loops are ignored
+            return []
+
+        return self._visit_assign_target_py38(top, node)
+
+    _visit_assign_target = (
+        _visit_assign_target_py38 if PY38 else _visit_assign_target_py37
+    )
+
+    def _check_unnecessary_assign(self, node: ast.AST) -> None:
+        top = self._top
+        if top is None or not isinstance(node, ast.Name):
+            return
+
+        var_name = node.id
+        return_lineno = node.lineno
+
+        if var_name not in top.assigns:
+            return
+
+        if var_name not in top.refs:
+            self.error_from_node(UnnecessaryAssign, node)
+            return
+
+        if self._has_refs_before_next_assign(top, var_name, return_lineno):
+            return
+
+        # always false before Python 3.8, no tries and loops are recorded
+        if self._has_refs_or_assigns_within_try_or_loop(top, var_name):
+            return
+
+        self.error_from_node(UnnecessaryAssign, node)
+
+    def _has_refs_or_assigns_within_try_or_loop(
+        self, top: Frame, var_name: str
+    ) -> bool:
+        return top.within_blocks(
+            top.sorted_refs(var_name)
+        ) or top.within_blocks(top.assigns[var_name])
+
+    def _has_refs_before_next_assign(
+        self, top: Frame, var_name: str, return_lineno: int
+    ) -> bool:
+        assigns = top.assigns[var_name]
+        refs = top.sorted_refs(var_name)
+
+        # refs between the closest assigns around the return:
+        # (before_assign, after_assign]
+        idx = bisect_right(assigns, return_lineno)
+        lo = bisect_right(refs, assigns[idx - 1]) if idx else 0
+        hi = (
+            bisect_right(refs, assigns[idx], lo)
+            if idx < len(assigns)
+            else len(refs)
+        )
+
+        # refs on the return line itself do not count
+        return hi - lo > bisect_right(
+            refs, return_lineno, lo, hi
+        ) - bisect_left(refs, return_lineno, lo, hi)
+
+
+class UnnecessaryReturnNoneMixin(Visitor[None]):
+    def _check_unnecessary_return_none(
+        self, none_returns: List[ast.Return]
+    ) -> None:
+        for node in none_returns:
+            self.error_from_node(UnnecessaryReturnNone, node)
+
+
+class ImplicitReturnValueMixin(Visitor[None]):
+    def _check_implicit_return_value(
+        self, bare_returns: List[ast.Return]
+    ) -> None:
+        for node in bare_returns:
+            self.error_from_node(ImplicitReturnValue, node)
+
+
+class ImplicitReturnMixin(Visitor[None]):
+    # Handlers get the last statement of a block and return the last
+    # statements of its branches that have to be checked in turn.
+    def _implicit_return_if(self, node: ast.If) -> List[ast.stmt]:
+        if not node.body or not node.orelse:
+            self.error_from_node(ImplicitReturn, node)
+            return []
+        return [node.body[-1], node.orelse[-1]]
+
+    def _implicit_return_for(self, node: ForLoop) -> List[ast.stmt]:
+        if not node.orelse:
+            self.error_from_node(ImplicitReturn, node)
+            return []
+        return [node.orelse[-1]]
+
+    def _implicit_return_with(self, node: With) -> List[ast.stmt]:
+        return [node.body[-1]]
+
+    def _implicit_return_assert(self, node: ast.Assert) -> List[ast.stmt]:
+        if not is_false(node.test):
+            self.error_from_node(ImplicitReturn, node)
+        return []
+
+    _IMPLICIT_RETURN_DISPATCH: ClassVar[
+        Dict[Type[ast.AST], Callable[[Any, Any], List[ast.stmt]]]
+    ] = {
+        ast.If: _implicit_return_if,
+        ast.For: _implicit_return_for,
+        ast.AsyncFor: _implicit_return_for,
+        ast.With: _implicit_return_with,
+        ast.AsyncWith: _implicit_return_with,
+        ast.Assert: _implicit_return_assert,
+    }
+
+    def _check_implicit_return(self, last_node: ast.AST) -> None:
+        dispatch = self._IMPLICIT_RETURN_DISPATCH
+        todo = [last_node]
+        while todo:
+            node = todo.pop()
+            handler = dispatch.get(type(node))
+            if handler is not None:
+                # pushed in reverse to check the first branch first
+                todo.extend(reversed(handler(self, node)))
+            elif not isinstance(node, TERMINAL_TYPES):
+                self.error_from_node(ImplicitReturn, node)
@@ -5,7 +5,7 @@ from .visitors import ReturnVisitor
 __version__ = '1.1.3'
 
 
-class ReturnPlugin(Plugin):
+class ReturnPlugin(Plugin[None]):
     name = 'flake8-return'
     version = __version__
     visitors = [ReturnVisitor]
@@ -1,5 +1,5 @@
 import ast
-from typing import Optional
+from typing import List, NamedTuple, Optional
 
 
 def is_none(node: Optional[ast.AST]) -> bool:
@@ -8,3 +8,28 @@ def is_none(node: Optional[ast.AST]) -> bool:
 
 def is_false(node: Optional[ast.AST]) -> bool:
     return isinstance(node, ast.NameConstant) and node.value is False
+
+
+def child_nodes(node: ast.AST) -> List[ast.AST]:
+    # same nodes as ast.iter_child_nodes, without its two nested
+    # generators, which cost more than the rest of the walk per node
+    children: List[ast.AST] = []
+    for name in node._fields:
+        field = getattr(node, name, None)
+        if isinstance(field, ast.AST):
+            children.append(field)
+            continue
+
+        if not isinstance(field, list):
+            continue
+
+        for item in field:
+            if isinstance(item, ast.AST):
+                children.append(item)
+    return children
+
+
+class ScopeReturns(NamedTuple):
+    bare: List[ast.Return]  # `return`
+    none: List[ast.Return]  # `return None`
+    values: List[ast.expr]  # any other returned value
@@ -53,6 +53,15 @@ implicit_return = (
         else:
             print()  # error
     """,
+    # nested function in function without return
+    """
+    def x():
+        def y(z):
+            if z:
+                return 1
+            print()  # error
+        y(1)
+    """,
 )
 
 
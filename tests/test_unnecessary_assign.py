@@ -42,6 +42,33 @@ unnecessary_assign = [
         print(a)
         return a
     """,
+    """
+    def x():
+        a = 1
+
+        def y():
+            print(a)
+
+        y()
+        return a  # error
+    """,
+    """
+    def x(y):
+        def z():
+            a = 1
+            return a  # error
+
+        if y:
+            return
+        print(z())
+    """,
+    # list fields holding more than nodes: global names, the None key of `**y`
+    """
+    def x(y):
+        global z
+        a = {**y, 'b': z}
+        return a  # error
+    """,
     # Can be refactored false positives
     """
     # https://github.com/afonasev/flake8-return/issues/47#issuecomment-1122571066
@@ -125,6 +152,12 @@ error_not_exists = [
         return a
     """,
     """
+    def x(y):
+        a = 1
+        y[a] = 2
+        return a
+    """,
+    """
     def x():
         a = lambda x: x
         a()
@@ -246,6 +279,29 @@ if sys.version_info >= (3, 8):
         return success
     """,
             """
+    def try_after_loops():
+        for i in range(10):
+            print(i)
+        for j in range(10):
+            print(j)
+        try:
+            success = True
+        except Exception:
+            success = False
+        return success
+    """,
+            """
+    def loop_within_try():
+        success = False
+        try:
+            for i in range(10):
+                print(i)
+            success = True
+        except Exception:
+            print("exception")
+        return success
+    """,
+            """
     # https://github.com/afonasev/flake8-return/issues/66
     def close(self):
         any_failed = False
@@ -291,3 +347,10 @@ else:
 @pytest.mark.parametrize('src', error_not_exists, ids=ids(error_not_exists))
 def test_error_not_exists(src):
     assert_not_error(ReturnVisitor, src)
+
+
+def test_deeply_nested_expression():
+    # deeper than the recursion limit, handled by the iterative walk
+    value = ' + '.join('a' * 2000)
+    src = f'def x(a):\n    b = {value}\n    return b\n'
+    assert_error(ReturnVisitor, src, UnnecessaryAssign)